@@ -0,0 +1,33 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import autotweak  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def data_dir(tmp_path, monkeypatch):
+    """Aísla el directorio de datos (log, diario, cachés) en un temporal"""
+    monkeypatch.setattr(autotweak, "LOG_DIRS", [str(tmp_path / "data")])
+    monkeypatch.setattr(autotweak, "_log_dir", None)
+    monkeypatch.setattr(autotweak, "_journal", None)
+    monkeypatch.setattr(autotweak, "ANSWERS", {})
+    monkeypatch.setattr(autotweak, "INTERACTIVE", False)
+    return tmp_path / "data"
+
+
+@pytest.fixture
+def sysctl_root(tmp_path, monkeypatch):
+    """Un /proc/sys falso: set(clave, valor) crea el archivo del parámetro"""
+    root = tmp_path / "proc-sys"
+    monkeypatch.setattr(autotweak, "SYSCTL_ROOT", str(root))
+
+    def set_value(param, value):
+        path = autotweak.sysctl_path(param)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(value + "\n")
+    return set_value
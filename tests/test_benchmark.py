@@ -0,0 +1,22 @@
+import autotweak
+
+
+def test_run_benchmarks_does_not_measure_startup(monkeypatch):
+    monkeypatch.setattr(autotweak, "writable_mounts_by_device", lambda: {})
+    for name in ("bench_memory_copy", "bench_process_latency", "bench_loopback_tcp", "bench_timer_jitter"):
+        monkeypatch.setattr(autotweak, name, lambda **kwargs: {"ms": 1.0})
+
+    def startup(**kwargs):
+        raise AssertionError("el arranque solo se mide con benchmark --startup")
+    monkeypatch.setattr(autotweak, "bench_startup", startup)
+    assert set(autotweak.run_benchmarks(quick=True)) == {"memory", "process", "tcp_loopback", "timer"}
+
+
+def test_benchmark_startup_compares_with_previous_measure(monkeypatch):
+    measures = iter([{"import_ms": 80.0}, {"import_ms": 40.0}])
+    monkeypatch.setattr(autotweak, "bench_startup", lambda runs: next(measures))
+    autotweak.benchmark_command(startup=True, quick=True)
+    [record] = autotweak.benchmark_command(startup=True, quick=True)
+    assert record["label"] == "startup"
+    assert [r["results"] for r in autotweak.load_benchmarks()] == [
+        {"startup": {"import_ms": 80.0}}, {"startup": {"import_ms": 40.0}}]
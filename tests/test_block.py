@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+import autotweak
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text + "\n")
+
+
+@pytest.fixture
+def block_sysfs(tmp_path, monkeypatch):
+    """Un /sys/block falso: add(nombre, rotacional, esclavos, scheduler) crea un dispositivo"""
+    root = tmp_path / "block"
+    monkeypatch.setattr(autotweak, "BLOCK_SYSFS", str(root))
+
+    def add(name, rotational=False, slaves=(), scheduler="none [mq-deadline] kyber bfq", **queue):
+        write(f"{root}/{name}/queue/rotational", "1" if rotational else "0")
+        write(f"{root}/{name}/size", "2048")
+        if scheduler is not None:
+            write(f"{root}/{name}/queue/scheduler", scheduler)
+        for attribute, value in queue.items():
+            write(f"{root}/{name}/queue/{attribute}", str(value))
+        os.makedirs(f"{root}/{name}/slaves", exist_ok=True)
+        for slave in slaves:
+            os.makedirs(f"{root}/{name}/slaves/{slave}")
+    add("nvme0n1")
+    add("sda", rotational=True)
+    add("sdb")
+    add("vda")
+    add("loop0")
+    # Los volúmenes basados en bio no tienen scheduler
+    add("dm-0", slaves=["sda", "nvme0n1"], scheduler=None)
+    add("md0", slaves=["sdb", "nvme0n1"], scheduler=None)
+    add("dm-1", slaves=["md0"], scheduler=None)
+    add("dm-2", slaves=["loop0"], scheduler=None)
+    return add
+
+
+def test_resolve_block_class(block_sysfs):
+    devices = autotweak.SystemProfile(use_cache=False).block_devices
+    classes = {name: autotweak.resolve_block_class(name, devices) for name in devices}
+    assert classes == {"nvme0n1": "nvme", "sda": "hdd", "sdb": "ssd", "vda": "virtio", "loop0": None,
+                       # Un volumen apilado toma la clase de su miembro más lento, también anidado
+                       "dm-0": "hdd", "md0": "ssd", "dm-1": "ssd", "dm-2": None}
+
+
+def test_plan_block_queue_tuning_only_lists_changes(block_sysfs, tmp_path):
+    block_sysfs("sdc", rotational=True, scheduler="mq-deadline [bfq] none", nr_requests=128, read_ahead_kb=128)
+    plan = autotweak.plan_block_queue_tuning(autotweak.SystemProfile(use_cache=False))
+    root = autotweak.BLOCK_SYSFS
+    assert plan["sdc"] == {"class": "hdd", "settings": {f"{root}/sdc/queue/read_ahead_kb": ("128", "1024")}}
+    assert plan["nvme0n1"]["settings"] == {f"{root}/nvme0n1/queue/scheduler": ("mq-deadline", "none")}
+    assert plan["dm-0"] == {"class": "hdd", "settings": {}}
+    assert "loop0" not in plan
+
+
+def test_apply_block_queue_tuning_records_originals(block_sysfs):
+    block_sysfs("sdc", rotational=True, scheduler="mq-deadline [bfq] none", nr_requests=64, read_ahead_kb=1024)
+    changes = {"actions": []}
+    autotweak.apply_block_queue_tuning(changes, autotweak.SystemProfile(use_cache=False))
+    root = autotweak.BLOCK_SYSFS
+    assert changes["original_values"][f"{root}/sdc/queue/nr_requests"] == "64"
+    assert f"{root}/sdc/queue/read_ahead_kb" not in changes["original_values"]
+    assert "set sdc nr_requests=128" in changes["actions"]
+    with open(f"{root}/sdc/queue/nr_requests") as f:
+        assert f.read() == "128"
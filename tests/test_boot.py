@@ -0,0 +1,122 @@
+import os
+
+import pytest
+
+import autotweak
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "boot")
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name)) as f:
+        return f.read()
+
+
+@pytest.fixture
+def analysis():
+    sources = autotweak.boot_data_sources(FIXTURES)
+    return autotweak.analyze_boot(autotweak.collect_boot_data(sources, run=False))
+
+
+@pytest.mark.parametrize("text, seconds", [
+    ("6.019s", 6.019),
+    ("900ms", 0.9),
+    ("1min 2.500s", 62.5),
+    ("1h 2min", 3720.0),
+    ("350us", 0.00035),
+    ("foo.service", None),
+    ("2.5s extra", None),
+])
+def test_parse_time_span(text, seconds):
+    if seconds is None:
+        assert autotweak.parse_time_span(text) is None
+    else:
+        assert autotweak.parse_time_span(text) == pytest.approx(seconds)
+
+
+def test_parse_blame():
+    blame = autotweak.parse_blame(read_fixture("blame.txt"))
+    assert blame["slow-batch.service"] == pytest.approx(62.5)
+    assert blame["cups.service"] == pytest.approx(0.9)
+    assert blame["NetworkManager-wait-online.service"] == pytest.approx(6.019)
+    assert len(blame) == 7
+
+
+def test_parse_critical_chain():
+    chain = autotweak.parse_critical_chain(read_fixture("critical-chain.txt"))
+    # Las líneas de cabecera mencionan "@" y "+" pero no son unidades
+    assert [link["unit"] for link in chain] == [
+        "graphical.target", "multi-user.target", "docker.service", "network-online.target",
+        "NetworkManager-wait-online.service", "NetworkManager.service", "dbus.service"]
+    assert chain[0] == {"unit": "graphical.target", "at": pytest.approx(12.345), "took": 0.0}
+    assert chain[2]["took"] == pytest.approx(4.22)
+    assert chain[5]["took"] == pytest.approx(0.19)
+
+
+def test_parse_systemd_dump():
+    units = autotweak.parse_systemd_dump(read_fixture("dump.txt"))
+    docker = units["docker.service"]
+    assert docker["file_state"] == "enabled"
+    assert docker["active_state"] == "active"
+    assert docker["deps"]["After"] == {"network-online.target", "containerd.service"}
+    assert docker["deps"]["Wants"] == {"network-online.target", "containerd.service"}
+    assert units["bluetooth.service"]["deps"]["RequiredBy"] == {"blueman.service"}
+    # Las líneas anidadas (ExecStart) y las que no son dependencias se ignoran
+    assert "Command Line" not in docker["deps"]
+    assert "Description" not in docker["deps"]
+
+
+def test_analyze_boot_ranks_by_critical_path_saving(analysis):
+    assert analysis["target"] == "graphical.target"
+    assert analysis["boot_seconds"] == pytest.approx(12.345)
+    assert analysis["slowest_seconds"] == pytest.approx(62.5)
+    ranked = [(c["unit"], c["saving"]) for c in analysis["candidates"] if c["saving"] > 0]
+    # Sin wait-online, docker sigue esperando a containerd (2,1 s en vez de 6,209 s)
+    assert ranked[0] == ("docker.service", pytest.approx(4.22))
+    assert ranked[1] == ("NetworkManager-wait-online.service", pytest.approx(4.109))
+    # Un servicio lento que no está en la ruta crítica no ahorra nada
+    slow = next(c for c in analysis["candidates"] if c["unit"] == "slow-batch.service")
+    assert slow["saving"] == 0
+    assert slow["seconds"] == pytest.approx(62.5)
+
+
+def test_analyze_boot_reverse_dependency_checks(analysis):
+    candidates = {c["unit"]: c for c in analysis["candidates"]}
+    assert candidates["bluetooth.service"]["blocked"] == ["la necesita blueman.service"]
+    assert "la arrastra docker.service" in candidates["containerd.service"]["blocked"][0]
+    assert candidates["NetworkManager.service"]["blocked"] == ["unidad esencial"]
+    assert candidates["cups.service"]["warnings"] == ["se activará bajo demanda desde cups.socket"]
+    assert candidates["NetworkManager-wait-online.service"]["warnings"] == [
+        "docker.service espera a network-online.target"]
+    # Las unidades estáticas no se pueden deshabilitar y no son candidatas
+    assert "dbus.service" not in candidates
+
+
+def test_analyze_boot_without_dump_uses_chain_only():
+    texts = {"critical-chain": read_fixture("critical-chain.txt"), "blame": "", "dump": ""}
+    analysis = autotweak.analyze_boot(texts)
+    assert analysis["modeled_seconds"] is None
+    docker = next(c for c in analysis["candidates"] if c["unit"] == "docker.service")
+    assert docker["saving"] == pytest.approx(4.22)
+    assert docker["blocked"] == ["sin datos de dependencias (systemd-analyze dump)"]
+    assert autotweak.boot_candidates(analysis) == []
+
+
+def test_boot_candidates(analysis, monkeypatch):
+    assert [c["unit"] for c in autotweak.boot_candidates(analysis)] == [
+        "docker.service", "NetworkManager-wait-online.service"]
+    # Lo pedido en las respuestas se propone aunque no ahorre, pero nunca si está bloqueado
+    monkeypatch.setitem(autotweak.ANSWERS, "disable_service:cups.service", "s")
+    monkeypatch.setitem(autotweak.ANSWERS, "disable_service:bluetooth.service", "s")
+    assert [c["unit"] for c in autotweak.boot_candidates(analysis)] == [
+        "docker.service", "NetworkManager-wait-online.service", "cups.service"]
+
+
+def test_boot_start_timeout(analysis):
+    assert autotweak.boot_start_timeout({"slowest_seconds": 3.0}) == 15
+    assert autotweak.boot_start_timeout({"slowest_seconds": 20.2}) == 41
+    assert autotweak.boot_start_timeout(analysis) == 90
+
+
+def test_collect_boot_data_without_sources_or_systemd():
+    assert autotweak.collect_boot_data({}, run=False) == {"blame": "", "critical-chain": "", "dump": ""}
@@ -0,0 +1,58 @@
+import argparse
+
+import pytest
+
+import autotweak
+
+
+def test_parse_module_list():
+    assert autotweak.parse_module_list("all") == list(autotweak.OPTIMIZATION_MODULES)
+    assert autotweak.parse_module_list("kernel, storage,") == ["kernel", "storage"]
+
+
+def test_parse_module_list_rejects_unknown_modules():
+    with pytest.raises(argparse.ArgumentTypeError, match="desconocidas: turbo"):
+        autotweak.parse_module_list("kernel,turbo")
+
+
+def test_parse_args_module_list():
+    args = autotweak.parse_args(["apply", "kernel,tcp"])
+    assert args.modules == ["kernel", "tcp"]
+
+
+def test_parse_slice_settings():
+    overrides = autotweak.parse_slice_settings([
+        "background.cpu.max=0.25", "background.io.max=8:0 rbps=1048576",
+        "background.io.max=8:16 wbps=1048576", "latency.cpu.weight=500",
+        "batch.memory.high=2G", "latency.memory.low=1", "batch.cpuset.cpus=2-7"])
+    assert overrides == {
+        "background": {"cpu.max": 0.25, "io.max": ["8:0 rbps=1048576", "8:16 wbps=1048576"]},
+        "latency": {"cpu.weight": 500, "memory.low": 1.0},
+        "batch": {"memory.high": "2G", "cpuset.cpus": "2-7"},
+    }
+
+
+@pytest.mark.parametrize("setting", ["gaming.cpu.weight=100", "batch.cpu.weight", "batch=1", "batch.cpu.weight="])
+def test_parse_slice_settings_rejects_invalid(setting):
+    with pytest.raises(ValueError):
+        autotweak.parse_slice_settings([setting])
+
+
+@pytest.fixture
+def fake_slices(monkeypatch):
+    monkeypatch.setattr(autotweak, "cgroup_v2_available", lambda: True)
+    monkeypatch.setattr(autotweak, "show_slices", lambda: None)
+    monkeypatch.setattr(autotweak, "apply_slice_rules",
+                        lambda rules, dry_run, changes: {"background": [(4242, "apt")], "batch": []})
+
+
+def test_slices_move_is_journaled_without_apply(fake_slices):
+    autotweak.run_subcommand(autotweak.parse_args(["slices", "--move"]))
+    [entry] = autotweak.get_journal().active()
+    assert entry["type"] == "slices"
+    assert entry["actions"] == ["moved 1 processes to autotweak-background.slice"]
+
+
+def test_slices_move_dry_run_is_not_journaled(fake_slices):
+    autotweak.run_subcommand(autotweak.parse_args(["slices", "--move", "--dry-run"]))
+    assert autotweak.get_journal().active() == []
@@ -0,0 +1,66 @@
+import os
+
+import pytest
+
+import autotweak
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text + "\n")
+
+
+@pytest.fixture
+def cpufreq(tmp_path, monkeypatch):
+    """intel_pstate híbrido: policy0 con las CPUs 0-1 (rendimiento) y policy2 con las 2-3 (eficiencia)"""
+    cpu_sysfs = tmp_path / "devices" / "system" / "cpu"
+    monkeypatch.setattr(autotweak, "CPU_SYSFS", str(cpu_sysfs))
+    write(f"{tmp_path}/devices/cpu_core/cpus", "0-1")
+    write(f"{tmp_path}/devices/cpu_atom/cpus", "2-3")
+    write(f"{cpu_sysfs}/intel_pstate/no_turbo", "0")
+    for policy, cpus, hw_max in (("policy0", "0-1", 4000000), ("policy2", "2-3", 3000000)):
+        base = f"{cpu_sysfs}/cpufreq/{policy}"
+        for attribute, value in {"affected_cpus": cpus, "scaling_driver": "intel_pstate",
+                                 "scaling_governor": "powersave", "scaling_available_governors": "performance powersave",
+                                 "energy_performance_preference": "balance_performance",
+                                 "energy_performance_available_preferences":
+                                     "default performance balance_performance balance_power power",
+                                 "scaling_min_freq": "800000", "scaling_max_freq": str(hw_max),
+                                 "cpuinfo_min_freq": "800000", "cpuinfo_max_freq": str(hw_max)}.items():
+            write(f"{base}/{attribute}", value)
+    return str(cpu_sysfs)
+
+
+def test_plan_cpu_power_only_changes_differing_attributes(cpufreq):
+    policy2 = f"{cpufreq}/cpufreq/policy2"
+    assert autotweak.plan_cpu_power("balanced") == [
+        (f"{policy2}/energy_performance_preference", "balance_performance", "balance_power")]
+    write(f"{policy2}/energy_performance_preference", "balance_power")
+    assert autotweak.plan_cpu_power("balanced") == []
+
+
+def test_plan_cpu_power_performance_skips_epp(cpufreq):
+    plan = autotweak.plan_cpu_power("performance")
+    assert [(os.path.relpath(path, cpufreq), current, desired) for path, current, desired in plan] == [
+        ("cpufreq/policy0/scaling_governor", "powersave", "performance"),
+        ("cpufreq/policy2/scaling_governor", "powersave", "performance")]
+
+
+def test_plan_cpu_power_lowers_min_before_max(cpufreq):
+    write(f"{cpufreq}/cpufreq/policy2/scaling_min_freq", "2500000")
+    plan = autotweak.plan_cpu_power("powersave")
+    assert [(os.path.relpath(path, cpufreq), current, desired) for path, current, desired in plan] == [
+        ("cpufreq/policy0/energy_performance_preference", "balance_performance", "power"),
+        ("cpufreq/policy0/scaling_max_freq", "4000000", "3200000"),
+        ("cpufreq/policy2/energy_performance_preference", "balance_performance", "power"),
+        ("cpufreq/policy2/scaling_min_freq", "2500000", "800000"),
+        ("cpufreq/policy2/scaling_max_freq", "3000000", "1800000"),
+        ("intel_pstate/no_turbo", "0", "1")]
+
+
+def test_apply_cpu_power_records_originals(cpufreq):
+    changes = {"actions": []}
+    assert autotweak.apply_cpu_power("powersave", changes) == 5
+    assert changes["original_values"][f"{cpufreq}/intel_pstate/no_turbo"] == "0"
+    assert autotweak.plan_cpu_power("powersave") == []
@@ -0,0 +1,73 @@
+import types
+
+import pytest
+
+import autotweak
+from autotweak import AdaptiveRule
+
+
+class FakeSampler:
+    def __init__(self, devices=None):
+        pass
+
+    def sample(self):
+        return {}
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def daemon(sysctl_root, monkeypatch):
+    sysctl_root("vm.swappiness", "60")
+    sysctl_root("vm.vfs_cache_pressure", "100")
+    sysctl_root("vm.dirty_background_bytes", "0")
+    sysctl_root("vm.dirty_background_ratio", "10")
+    monkeypatch.setattr(autotweak, "get_system_profile",
+                        lambda: types.SimpleNamespace(disks=[], memory={"total": 8 << 30}))
+    monkeypatch.setattr(autotweak, "ProcSampler", FakeSampler)
+    monkeypatch.setattr(autotweak, "daemon_signals", lambda previous, current: {})
+    rules = [AdaptiveRule("vm.swappiness", lambda s, v: True, lambda v: v - 10, (1, 60), "swap-in", dwell=1),
+             AdaptiveRule("vm.vfs_cache_pressure", lambda s, v: True, lambda v: v + 25, (50, 200), "psi", dwell=1),
+             AdaptiveRule("vm.dirty_background_bytes", lambda s, v: True, lambda v: v // 2,
+                          (16 << 20, 1 << 30), "io", dwell=1)]
+    monkeypatch.setattr(autotweak, "build_daemon_rules", lambda knobs, disks: rules)
+
+    def run(**kwargs):
+        return autotweak.daemon_command(interval=0, cooldown=0, max_samples=3, **kwargs)
+    return run
+
+
+def test_daemon_writes_one_change_set_per_run(daemon):
+    result = daemon()
+    assert result["adjustments"] == 9
+    [entry] = autotweak.get_journal().active()
+    assert entry["type"] == "daemon"
+    # Solo los originales, no los valores intermedios; el ratio en lugar de los bytes
+    assert entry["original_values"] == {"vm.swappiness": 60, "vm.vfs_cache_pressure": 100,
+                                        "vm.dirty_background_ratio": 10}
+    assert entry["adjustments"] == {"vm.swappiness": 3, "vm.vfs_cache_pressure": 3, "vm.dirty_background_bytes": 3}
+    # Una acción con marca de tiempo por ajuste, en orden
+    assert len(entry["actions"]) == 9
+    swappiness = [action for action in entry["actions"] if " vm.swappiness " in action]
+    assert [action.split(" ", 2)[2] for action in swappiness] == [
+        "set vm.swappiness from 60 to 50 (swap-in)", "set vm.swappiness from 50 to 40 (swap-in)",
+        "set vm.swappiness from 40 to 30 (swap-in)"]
+    assert autotweak.read_sysctl("vm.swappiness") == 30
+    # El registro del primer ajuste y una actualización por cada uno de los siguientes
+    with open(autotweak.get_journal().path) as f:
+        assert len(f.readlines()) == 9
+
+
+def test_daemon_restore_on_exit(daemon):
+    daemon(restore_on_exit=True)
+    assert autotweak.read_sysctl("vm.swappiness") == 60
+    assert autotweak.read_sysctl("vm.vfs_cache_pressure") == 100
+    assert autotweak.read_sysctl("vm.dirty_background_ratio") == 10
+    assert autotweak.get_journal().active() == []
+
+
+def test_daemon_dry_run_does_not_touch_the_journal(daemon):
+    daemon(dry_run=True)
+    assert autotweak.read_sysctl("vm.swappiness") == 60
+    assert autotweak.get_journal().active() == []
@@ -0,0 +1,73 @@
+import autotweak
+
+GRUB = """GRUB_DEFAULT=0
+GRUB_TIMEOUT=5
+GRUB_DISTRIBUTOR=`lsb_release -i -s 2> /dev/null || echo Debian`
+GRUB_CMDLINE_LINUX_DEFAULT="quiet mitigations=auto"
+GRUB_CMDLINE_LINUX=""
+"""
+
+
+def grub_root(tmp_path, content=GRUB):
+    (tmp_path / "etc" / "default").mkdir(parents=True)
+    (tmp_path / "etc" / "default" / "grub").write_text(content)
+    return str(tmp_path)
+
+
+def test_tune_grub_cmdline(tmp_path):
+    root = grub_root(tmp_path)
+    changes = {"actions": []}
+    assert autotweak.tune_grub_cmdline(changes, root)
+    content = (tmp_path / "etc" / "default" / "grub").read_text()
+    assert 'GRUB_CMDLINE_LINUX_DEFAULT="mitigations=auto quiet splash fastboot"\n' in content
+    assert "GRUB_TIMEOUT=1\n" in content
+    assert "rootfstype" not in content and "noatime" not in content
+    # Una sola copia de seguridad, con el archivo original
+    [backup] = changes["original_files"].values()
+    with open(backup) as f:
+        assert f.read() == GRUB
+
+
+def test_tune_grub_cmdline_is_idempotent(tmp_path):
+    root = grub_root(tmp_path)
+    autotweak.tune_grub_cmdline({"actions": []}, root)
+    changes = {"actions": []}
+    assert not autotweak.tune_grub_cmdline(changes, root)
+    assert changes == {"actions": []}
+
+
+def test_tune_grub_cmdline_removes_noatime_from_earlier_versions(tmp_path):
+    root = grub_root(tmp_path, 'GRUB_TIMEOUT=1\nGRUB_CMDLINE_LINUX_DEFAULT="quiet splash fastboot noatime rootfstype=ext4"\n')
+    changes = {"actions": []}
+    assert autotweak.tune_grub_cmdline(changes, root)
+    assert (tmp_path / "etc" / "default" / "grub").read_text() == (
+        'GRUB_TIMEOUT=1\nGRUB_CMDLINE_LINUX_DEFAULT="rootfstype=ext4 quiet splash fastboot"\n')
+
+
+def test_tune_grub_cmdline_without_grub(tmp_path):
+    assert not autotweak.tune_grub_cmdline({"actions": []}, str(tmp_path))
+
+
+def test_set_grub_cmdline_params_is_idempotent(tmp_path):
+    root = grub_root(tmp_path)
+    nodes = {0: {"cpus": [0, 1]}, 1: {"cpus": [2, 3]}, 2: {"cpus": []}}
+    params = autotweak.static_hugepage_cmdline({2048: 64, 1048576: 1}, nodes)
+    assert params == ["hugepagesz=2M", "hugepages=128", "hugepagesz=1G", "hugepages=2"]
+    changes = {"actions": []}
+    assert autotweak.set_grub_cmdline_params(params, changes, root, replace=("hugepagesz",))
+    assert not autotweak.set_grub_cmdline_params(params, {"actions": []}, root, replace=("hugepagesz",))
+
+    # Un tamaño nuevo sustituye a todos los anteriores en lugar de acumularse
+    params = autotweak.static_hugepage_cmdline({2048: 32}, nodes)
+    assert autotweak.set_grub_cmdline_params(params, changes, root, replace=("hugepagesz",))
+    content = (tmp_path / "etc" / "default" / "grub").read_text()
+    assert 'GRUB_CMDLINE_LINUX_DEFAULT="quiet mitigations=auto hugepagesz=2M hugepages=64"\n' in content
+    assert len(changes["original_files"]) == 1
+
+
+def test_set_grub_cmdline_params_adds_missing_line(tmp_path):
+    root = grub_root(tmp_path, "GRUB_TIMEOUT=5\n")
+    assert autotweak.set_grub_cmdline_params(["transparent_hugepage=madvise"], {"actions": []}, root)
+    assert (tmp_path / "etc" / "default" / "grub").read_text() == (
+        'GRUB_TIMEOUT=5\nGRUB_CMDLINE_LINUX_DEFAULT="transparent_hugepage=madvise"\n')
+    assert not autotweak.set_grub_cmdline_params(["transparent_hugepage=madvise"], {"actions": []}, root)
@@ -0,0 +1,28 @@
+import os
+
+import pytest
+
+import autotweak
+
+PAGE_KB = os.sysconf("SC_PAGE_SIZE") // 1024
+
+
+def test_buddy_fragmentation(tmp_path, monkeypatch):
+    monkeypatch.setattr(autotweak, "PROC_ROOT", str(tmp_path))
+    # Bloques libres por orden 0..10; con orden 2 solo cuentan los de 4 páginas o más
+    (tmp_path / "buddyinfo").write_text(
+        "Node 0, zone      DMA      0      0      0      0      0      0      0      0      0      0      0\n"
+        "Node 0, zone   Normal     40     10      5\n"
+        "Node 1, zone   Normal      0      0      8\n")
+    zones = autotweak.buddy_fragmentation(order=2)
+    assert [(zone["node"], zone["zone"]) for zone in zones] == [(0, "DMA"), (0, "Normal"), (1, "Normal")]
+    assert zones[0]["free_kb"] == 0 and zones[0]["unusable"] == 0.0
+    # 40 + 10*2 + 5*4 = 80 páginas libres, de las que 60 están en bloques pequeños
+    assert zones[1]["free_kb"] == 80 * PAGE_KB
+    assert zones[1]["unusable"] == pytest.approx(60 / 80)
+    assert zones[2]["unusable"] == 0.0
+
+
+def test_buddy_fragmentation_without_buddyinfo(tmp_path, monkeypatch):
+    monkeypatch.setattr(autotweak, "PROC_ROOT", str(tmp_path))
+    assert autotweak.buddy_fragmentation() == []
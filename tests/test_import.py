@@ -0,0 +1,40 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Se ejecuta en un intérprete aparte para que el módulo se importe desde cero
+PROBE = textwrap.dedent("""
+    import os
+    import sys
+
+    touched = []
+
+    def audit(event, args):
+        if event in ("open", "os.mkdir", "os.remove", "os.rename", "os.chmod", "shutil.copyfile"):
+            # Los descriptores ya abiertos (open(fd)) no son rutas nuevas
+            if not isinstance(args[0], (str, bytes)):
+                return
+            path = os.fsdecode(args[0])
+            if not path.endswith((".py", ".pyc")) and "__pycache__" not in path and not path.startswith(sys.prefix):
+                touched.append((event, path))
+        elif event in ("subprocess.Popen", "ctypes.dlopen", "socket.connect"):
+            touched.append((event, str(args[0])))
+
+    sys.path.insert(0, {root!r})
+    sys.addaudithook(audit)
+    import autotweak
+    print("\\n".join(f"{{event}} {{path}}" for event, path in touched))
+""")
+
+
+def test_import_has_no_side_effects(tmp_path):
+    env = dict(os.environ, HOME=str(tmp_path))
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    result = subprocess.run([sys.executable, "-c", PROBE.format(root=ROOT)], cwd=tmp_path, env=env,
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == ""
+    # Ni el log ni el diario se crean al importar
+    assert os.listdir(tmp_path) == []
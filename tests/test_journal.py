@@ -0,0 +1,201 @@
+import json
+
+import pytest
+
+import autotweak
+
+
+def change(entry_id, **states):
+    return dict({"id": entry_id, "type": "kernel", "actions": []}, **states)
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return autotweak.ChangeJournal(str(tmp_path / "journal.jsonl"))
+
+
+def test_plan_rollback_consolidates_runs_of_selected_entries():
+    entries = [change("a", original_values={"vm.swappiness": 60}),
+               change("b", original_values={"vm.swappiness": 10})]
+    target, inherit, kept = autotweak.plan_rollback(entries, {"a", "b"})
+    # Se vuelve al original del primer conjunto de la racha
+    assert target == {"value:vm.swappiness": 60}
+    assert inherit == {} and kept == {}
+
+
+def test_plan_rollback_keeps_value_of_later_unselected_entry():
+    entries = [change("a", original_values={"vm.swappiness": 60}),
+               change("b", original_values={"vm.swappiness": 10})]
+    target, inherit, kept = autotweak.plan_rollback(entries, {"a"})
+    assert target == {}
+    assert inherit == {"b": {"value:vm.swappiness": 60}}
+    assert kept == {"value:vm.swappiness": "b"}
+
+
+def test_plan_rollback_exclusive_pairs_keep_oldest_original():
+    entries = [change("a", original_values={"vm.dirty_ratio": 20}),
+               change("b", original_values={"vm.dirty_bytes": 0})]
+    target, inherit, kept = autotweak.plan_rollback(entries, {"a", "b"})
+    assert target == {"value:vm.dirty_ratio": 20}
+
+
+def test_plan_rollback_files_and_units():
+    entries = [change("a", created_files=["/etc/x.conf"], enabled_units=["fstrim.timer"],
+                      disabled_services=["cups.service"], root="/mnt/img")]
+    target, inherit, kept = autotweak.plan_rollback(entries, {"a"})
+    assert target == {"file:/etc/x.conf": None, "unit:fstrim.timer@/mnt/img": "disabled",
+                      "service:cups.service@/mnt/img": "enabled"}
+
+
+def test_journal_append_query_and_checksums(journal):
+    first = journal.append({"type": "kernel", "actions": [], "original_values": {"vm.swappiness": 60}})
+    journal.append({"type": "storage", "actions": [], "original_files": {"/etc/fstab": "/b/fstab.bak"}})
+    assert first["checksum"] == autotweak.journal_checksum(first)
+    assert [entry["type"] for entry in journal.active()] == ["kernel", "storage"]
+    assert [entry["id"] for entry in journal.query(key="vm.swappiness")] == [first["id"]]
+    assert [entry["type"] for entry in journal.query(change_type="storage")] == ["storage"]
+
+
+def test_journal_ignores_corrupt_and_tampered_lines(journal, tmp_path):
+    journal.append({"type": "kernel", "actions": []})
+    record = journal.append({"type": "storage", "actions": []})
+    with open(journal.path, "a") as f:
+        f.write("{no es json\n")
+        tampered = dict(record, type="gaming")
+        f.write(json.dumps(tampered) + "\n")
+    # Una escritura interrumpida, sin salto de línea final, se deja para más tarde
+    with open(journal.path, "a") as f:
+        f.write('{"op": "change"')
+    reader = autotweak.ChangeJournal(journal.path)
+    assert [entry["type"] for entry in reader.active()] == ["kernel", "storage"]
+    assert reader.corrupt == 2
+    # La siguiente escritura cierra la línea a medias y no se pega a ella
+    reader.append({"type": "cpu", "actions": []})
+    assert [entry["type"] for entry in autotweak.ChangeJournal(journal.path).active()] == [
+        "kernel", "storage", "cpu"]
+
+
+def test_journal_mark_reverted_and_compact(journal, tmp_path):
+    backup = tmp_path / "fstab.autotweak.1.bak"
+    backup.write_text("original\n")
+    kept_backup = tmp_path / "grub.autotweak.2.bak"
+    kept_backup.write_text("original\n")
+    old = journal.append({"type": "storage", "actions": [], "original_files": {"/etc/fstab": str(backup)}})
+    new = journal.append({"type": "boot", "actions": [], "original_files": {"/etc/default/grub": str(kept_backup)}})
+    journal.mark_reverted([old["id"]])
+    assert [entry["id"] for entry in journal.active()] == [new["id"]]
+    assert len(journal.query(include_reverted=True)) == 2
+
+    assert journal.compact() == 1
+    assert not backup.exists()
+    assert kept_backup.exists()
+    reader = autotweak.ChangeJournal(journal.path)
+    assert [entry["id"] for entry in reader.query(include_reverted=True)] == [new["id"]]
+    assert reader.corrupt == 0
+
+
+def test_journal_inherited_originals_survive_compaction(journal):
+    old = journal.append({"type": "kernel", "actions": [], "original_values": {"vm.swappiness": 60}})
+    new = journal.append({"type": "kernel", "actions": [], "original_values": {"vm.swappiness": 10}})
+    journal.mark_reverted([old["id"]], inherit={new["id"]: {"value:vm.swappiness": 60}})
+    journal.compact()
+    entry = autotweak.ChangeJournal(journal.path).active()[0]
+    assert autotweak.rollback_key_states(entry) == {"value:vm.swappiness": 60}
+
+
+def test_journal_migrates_legacy_changes_file(tmp_path):
+    legacy = tmp_path / "autotweak_changes.json"
+    legacy.write_text(json.dumps([{"type": "kernel", "timestamp": "2024-01-01 10:00:00", "actions": ["x"]}]))
+    journal = autotweak.ChangeJournal(str(tmp_path / "journal.jsonl"), legacy_path=str(legacy))
+    entries = journal.active()
+    assert [entry["id"] for entry in entries] == ["legacy.1"]
+    assert not legacy.exists()
+    assert (tmp_path / "autotweak_changes.json.migrated").exists()
+
+
+def test_journal_update_completes_an_entry(journal):
+    record = journal.append({"type": "daemon", "actions": [], "original_values": {"vm.swappiness": 60}})
+    journal.update(record["id"], {"actions": ["set vm.dirty_ratio"], "original_values": {
+        "vm.swappiness": 60, "vm.dirty_ratio": 20}, "id": "otro"})
+    reader = autotweak.ChangeJournal(journal.path)
+    [entry] = reader.active()
+    assert entry["id"] == record["id"]
+    assert entry["actions"] == ["set vm.dirty_ratio"]
+    assert [e["id"] for e in reader.query(key="vm.dirty_ratio")] == [record["id"]]
+    # Tras compactar, la actualización queda fundida en el propio registro
+    reader.compact()
+    with open(journal.path) as f:
+        assert len(f.readlines()) == 1
+    assert autotweak.ChangeJournal(journal.path).active()[0]["original_values"]["vm.dirty_ratio"] == 20
+
+
+def test_plan_rollback_partial_selection_across_overlapping_sets():
+    entries = [change("a", original_values={"vm.swappiness": 60, "vm.dirty_ratio": 20}),
+               change("b", original_values={"vm.swappiness": 10}),
+               change("c", original_values={"vm.swappiness": 30, "vm.vfs_cache_pressure": 100})]
+    # Sin el último, el valor vivo es de "c": "b" solo le pasa su original
+    target, inherit, kept = autotweak.plan_rollback(entries, {"a", "b"})
+    assert target == {"value:vm.dirty_ratio": 20}
+    assert inherit == {"c": {"value:vm.swappiness": 60}}
+    assert kept == {"value:vm.swappiness": "c"}
+    # Con "a" y "c" pero no "b", la racha final es solo "c"
+    target, inherit, kept = autotweak.plan_rollback(entries, {"a", "c"})
+    assert target == {"value:vm.swappiness": 30, "value:vm.dirty_ratio": 20, "value:vm.vfs_cache_pressure": 100}
+    assert inherit == {"b": {"value:vm.swappiness": 60}}
+    assert kept == {}
+
+
+@pytest.fixture
+def overlapping(sysctl_root):
+    """Tres conjuntos reales: a (swappiness y dirty_ratio), b (swappiness) y c (vfs_cache_pressure)"""
+    sysctl_root("vm.swappiness", "60")
+    sysctl_root("vm.dirty_ratio", "20")
+    sysctl_root("vm.vfs_cache_pressure", "100")
+    ids = []
+    for profile in ({"vm.swappiness": 10, "vm.dirty_ratio": 10}, {"vm.swappiness": 30}, {"vm.vfs_cache_pressure": 50}):
+        changes = {"type": "kernel", "actions": [], "original_values": {}}
+        autotweak.apply_sysctl_profile(profile, changes)
+        ids.append(autotweak.save_changes(changes))
+    return ids
+
+
+def test_rollback_of_an_earlier_set_keeps_the_later_value(overlapping):
+    a, b, c = overlapping
+    report = autotweak.rollback([a])
+    assert report["reverted"] == [a] and report["kept"] == {"value:vm.swappiness": b}
+    assert autotweak.read_sysctl("vm.swappiness") == 30
+    assert autotweak.read_sysctl("vm.dirty_ratio") == 20
+    # "b" heredó el original de "a": al revertirlo se vuelve al valor de antes de todo
+    autotweak.rollback([b])
+    assert autotweak.read_sysctl("vm.swappiness") == 60
+    assert [entry["id"] for entry in autotweak.get_journal().active()] == [c]
+
+
+def test_rollback_non_contiguous_selection(overlapping):
+    a, b, c = overlapping
+    autotweak.rollback([a, c])
+    assert autotweak.read_sysctl("vm.swappiness") == 30
+    assert autotweak.read_sysctl("vm.dirty_ratio") == 20
+    assert autotweak.read_sysctl("vm.vfs_cache_pressure") == 100
+    autotweak.rollback([b])
+    assert autotweak.read_sysctl("vm.swappiness") == 60
+    assert autotweak.get_journal().active() == []
+
+
+def test_rollback_keeps_failed_sets_active(overlapping, sysctl_root):
+    a, b, c = overlapping
+    record = autotweak.get_journal().append({"type": "kernel", "actions": [],
+                                             "original_values": {"vm.no_existe": 1, "vm.vfs_cache_pressure": 50}})
+    report = autotweak.rollback([c, record["id"]])
+    assert report["failed"] == [record["id"]]
+    assert report["reverted"] == [c]
+    assert autotweak.read_sysctl("vm.vfs_cache_pressure") == 100
+    assert [entry["id"] for entry in autotweak.get_journal().active()] == [a, b, record["id"]]
+
+
+def test_rollback_dry_run_changes_nothing(overlapping):
+    a, b, c = overlapping
+    report = autotweak.rollback([a, b], dry_run=True)
+    assert report["target"] == {"value:vm.swappiness": 60, "value:vm.dirty_ratio": 20}
+    assert autotweak.read_sysctl("vm.swappiness") == 30
+    assert len(autotweak.get_journal().active()) == 3
@@ -0,0 +1,55 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import autotweak
+
+
+@pytest.fixture
+def sleeper():
+    # Un proceso con varios hilos a los que aplicar la política
+    process = subprocess.Popen([sys.executable, "-c", "import threading, time\n"
+                                "for _ in range(2): threading.Thread(target=time.sleep, args=(60,), daemon=True).start()\n"
+                                "time.sleep(60)"])
+    while len(os.listdir(f"/proc/{process.pid}/task")) < 3:
+        pass
+    yield process.pid
+    process.kill()
+    process.wait()
+
+
+def thread_states(pid, fields):
+    return {tid: autotweak.thread_launch_state(int(tid), fields) for tid in os.listdir(f"/proc/{pid}/task")}
+
+
+@pytest.mark.skipif(os.geteuid() != 0, reason="necesita root para devolver el nice")
+def test_launch_pid_is_journaled_and_reverted(sleeper):
+    fields = ["cpus", "nice", "ioprio", "policy"]
+    original = thread_states(sleeper, fields)
+    cpus = [max(os.sched_getaffinity(sleeper))]
+    result = autotweak.launch_command(None, policy="batch", nice=5, io_class="idle", cpus=cpus, pid=sleeper)
+    assert all(not errors for errors in result["threads"].values())
+    changed = thread_states(sleeper, fields)
+    assert all(state["cpus"] == cpus and state["nice"] == 5 and state["policy"] == [os.SCHED_BATCH, 0]
+               for state in changed.values())
+
+    [entry] = autotweak.get_journal().active()
+    assert entry["id"] == result["id"]
+    assert set(entry["thread_states"]) == set(original)
+    assert entry["process_start"] == autotweak.process_start_time(sleeper)
+
+    report = autotweak.rollback([entry["id"]])
+    assert report["errors"] == {}
+    assert report["reverted"] == [entry["id"]]
+    assert thread_states(sleeper, fields) == original
+
+
+def test_launch_pid_revert_skips_finished_process(sleeper, monkeypatch):
+    entry = {"id": "x", "pid": sleeper, "process_start": "1", "thread_states": {str(sleeper): {"nice": 0}}}
+    target, inherit, kept = autotweak.plan_rollback([entry], {"x"})
+    assert target == {f"thread:{sleeper}/{sleeper}": {"nice": 0, "start": "1"}}
+    # El PID existe pero su arranque no coincide: es otro proceso
+    monkeypatch.setattr(autotweak, "restore_thread_state", lambda tid, state: pytest.fail("proceso equivocado"))
+    assert autotweak.apply_rollback_state(target) == {f"thread:{sleeper}/{sleeper}": None}
@@ -0,0 +1,90 @@
+import os
+
+import pytest
+
+import autotweak
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text + "\n")
+
+
+def read(path):
+    with open(path) as f:
+        return f.read().strip()
+
+
+@pytest.fixture
+def net_sysfs(tmp_path, monkeypatch):
+    """Una tarjeta con dos colas en el nodo 0 (CPUs 0-3) y la interfaz de loopback"""
+    sys_net, proc_irq = tmp_path / "net", tmp_path / "irq"
+    monkeypatch.setattr(autotweak, "NET_SYSFS", str(sys_net))
+    monkeypatch.setattr(autotweak, "PROC_IRQ", str(proc_irq))
+    monkeypatch.setattr(autotweak, "PROC_INTERRUPTS", str(tmp_path / "interrupts"))
+    monkeypatch.setattr(autotweak, "NODE_SYSFS", str(tmp_path / "node"))
+    monkeypatch.setattr(autotweak, "CPU_SYSFS", str(tmp_path / "cpu"))
+    monkeypatch.setattr(autotweak, "_system_profile", autotweak.SystemProfile(use_cache=False))
+    monkeypatch.setattr(autotweak, "irqbalance_running", lambda: False)
+    write(f"{tmp_path}/node/node0/cpulist", "0-3")
+    write(f"{tmp_path}/interrupts", "           CPU0\n 30:  10  PCI-MSI  eth0-TxRx-0\n"
+                                    " 31:  10  PCI-MSI  eth0-TxRx-1\n 32:  1  PCI-MSI  eth0-config")
+    write(f"{sys_net}/eth0/device/numa_node", "0")
+    for irq in (30, 31, 32):
+        write(f"{sys_net}/eth0/device/msi_irqs/{irq}", "msix")
+        write(f"{proc_irq}/{irq}/smp_affinity_list", "0-3")
+    for queue in (0, 1):
+        write(f"{sys_net}/eth0/queues/rx-{queue}/rps_cpus", "0")
+        write(f"{sys_net}/eth0/queues/rx-{queue}/rps_flow_cnt", "0")
+        write(f"{sys_net}/eth0/queues/tx-{queue}/xps_cpus", "0")
+    # lo no tiene dispositivo detrás: es virtual
+    write(f"{sys_net}/lo/queues/rx-0/rps_cpus", "0")
+    write(f"{sys_net}/lo/queues/tx-0/xps_cpus", "0")
+    return str(sys_net), str(proc_irq)
+
+
+def test_plan_network_steering_multiqueue_nic(net_sysfs):
+    sys_net, proc_irq = net_sysfs
+    plan = autotweak.plan_network_steering()
+    assert list(plan) == ["eth0"]
+    assert {path: desired for path, current, desired in plan["eth0"]} == {
+        # Una IRQ por CPU; la de configuración no lleva tráfico
+        f"{proc_irq}/30/smp_affinity_list": "0",
+        f"{proc_irq}/31/smp_affinity_list": "1",
+        # Menos colas que CPUs: cada cola de recepción reparte en su grupo
+        f"{sys_net}/eth0/queues/rx-0/rps_cpus": "3",
+        f"{sys_net}/eth0/queues/rx-0/rps_flow_cnt": str(autotweak.RFS_FLOW_ENTRIES // 2),
+        f"{sys_net}/eth0/queues/rx-1/rps_cpus": "c",
+        f"{sys_net}/eth0/queues/rx-1/rps_flow_cnt": str(autotweak.RFS_FLOW_ENTRIES // 2),
+        # Cada CPU transmite por una sola cola
+        f"{sys_net}/eth0/queues/tx-0/xps_cpus": "5",
+        f"{sys_net}/eth0/queues/tx-1/xps_cpus": "a",
+    }
+
+
+def test_plan_network_steering_skips_settings_already_in_place(net_sysfs):
+    sys_net, proc_irq = net_sysfs
+    write(f"{proc_irq}/30/smp_affinity_list", "0")
+    write(f"{sys_net}/eth0/queues/tx-0/xps_cpus", "00000005")
+    paths = [path for path, current, desired in autotweak.plan_network_steering(["eth0"])["eth0"]]
+    assert f"{proc_irq}/30/smp_affinity_list" not in paths
+    assert f"{sys_net}/eth0/queues/tx-0/xps_cpus" not in paths
+    assert len(paths) == 6
+
+
+def test_optimize_network_journals_and_reverts(net_sysfs, sysctl_root):
+    sys_net, proc_irq = net_sysfs
+    sysctl_root("net.core.rps_sock_flow_entries", "0")
+    changes = autotweak.optimize_network()
+    assert read(f"{sys_net}/eth0/queues/rx-1/rps_cpus") == "c"
+    assert read(f"{proc_irq}/31/smp_affinity_list") == "1"
+    assert autotweak.read_sysctl("net.core.rps_sock_flow_entries") == autotweak.RFS_FLOW_ENTRIES
+    # La interfaz de loopback no se toca
+    assert read(f"{sys_net}/lo/queues/rx-0/rps_cpus") == "0"
+    assert changes["actions"][-1] == "steered eth0: 8 IRQ/RPS/XPS settings"
+
+    autotweak.rollback([changes["id"]])
+    assert read(f"{sys_net}/eth0/queues/rx-1/rps_cpus") == "0"
+    assert read(f"{proc_irq}/31/smp_affinity_list") == "0-3"
+    assert autotweak.read_sysctl("net.core.rps_sock_flow_entries") == 0
@@ -0,0 +1,71 @@
+import os
+
+import pytest
+
+import autotweak
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text + "\n")
+
+
+PAGE_KB = os.sysconf("SC_PAGE_SIZE") // 1024
+
+
+@pytest.fixture
+def numa_tree(tmp_path, monkeypatch):
+    """Dos nodos con CPUs (0-1 y 2-3) y un nodo 2 solo de memoria"""
+    node_sysfs, proc = tmp_path / "node", tmp_path / "proc"
+    monkeypatch.setattr(autotweak, "NODE_SYSFS", str(node_sysfs))
+    monkeypatch.setattr(autotweak, "PROC_ROOT", str(proc))
+    for node, cpus, distances in ((0, "0-1", "10 21 30"), (1, "2-3", "21 10 30"), (2, "", "30 30 10")):
+        write(f"{node_sysfs}/node{node}/cpulist", cpus)
+        write(f"{node_sysfs}/node{node}/distance", distances)
+        write(f"{node_sysfs}/node{node}/meminfo",
+              f"Node {node} MemTotal:        4000000 kB\nNode {node} MemFree:         1000000 kB")
+        write(f"{node_sysfs}/node{node}/hugepages/hugepages-2048kB/nr_hugepages", str(node * 8))
+
+    def process(pid, comm, rss_pages, cpus_allowed, numa_maps):
+        write(f"{proc}/{pid}/comm", comm)
+        write(f"{proc}/{pid}/statm", f"{rss_pages * 2} {rss_pages} 0 0 0 0 0")
+        write(f"{proc}/{pid}/status", f"Name:\t{comm}\nCpus_allowed_list:\t{cpus_allowed}")
+        if numa_maps is not None:
+            write(f"{proc}/{pid}/numa_maps", numa_maps)
+    return process
+
+
+def test_numa_nodes_parses_sysfs(numa_tree):
+    nodes = autotweak.numa_nodes()
+    assert list(nodes) == [0, 1, 2]
+    assert nodes[0]["cpus"] == [0, 1]
+    assert nodes[2]["cpus"] == []
+    assert nodes[1]["distances"] == {0: 21, 1: 10, 2: 30}
+    assert nodes[1]["mem_total_kb"] == 4000000 and nodes[1]["mem_free_kb"] == 1000000
+    assert nodes[2]["hugepages"] == {2048: 16}
+
+
+def test_numa_placement_parses_numa_maps(numa_tree):
+    numa_tree(100, "postgres", 5000, "0-1", "\n".join([
+        "55d4c1a00000 default file=/usr/bin/postgres mapped=100 mapmax=3 N0=100 kernelpagesize_kB=4",
+        "7f0000000000 interleave:0-1 anon=300 dirty=300 N0=100 N1=200 kernelpagesize_kB=4",
+        "7f2000000000 default file=/anon_hugepage\\040(deleted) huge anon=2 N2=2 kernelpagesize_kB=2048",
+        "7ffd00000000 default stack anon=1 dirty=1 active=0 N0=1 kernelpagesize_kB=4",
+    ]))
+    # Con menos memoria residente: queda fuera del top 1
+    numa_tree(101, "bash", 100, "0-3", "55d4c1a00000 default anon=10 N1=10 kernelpagesize_kB=4")
+    # Sin numa_maps legible (proceso terminado o sin permiso): se omite
+    numa_tree(102, "kworker", 9000, "0-3", None)
+
+    [report] = autotweak.numa_placement(top=1)
+    assert report["pid"] == 100 and report["comm"] == "postgres"
+    assert report["rss_kb"] == 5000 * PAGE_KB
+    assert report["nodes_kb"] == {0: 201 * 4, 1: 200 * 4, 2: 2 * 2048}
+    assert report["home_nodes"] == [0]
+    total = 201 * 4 + 200 * 4 + 2 * 2048
+    assert report["remote_fraction"] == pytest.approx((200 * 4 + 2 * 2048) / total)
+
+    by_pid = {entry["pid"]: entry for entry in autotweak.numa_placement()}
+    assert set(by_pid) == {100, 101}
+    assert by_pid[101]["home_nodes"] == [0, 1] and by_pid[101]["remote_fraction"] == 0.0
@@ -0,0 +1,79 @@
+import os
+
+import pytest
+
+import autotweak
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text + "\n")
+
+
+@pytest.fixture
+def fake_proc(tmp_path, monkeypatch):
+    """Un /proc falso: add(pid, comm, oom_score, rss_pages, adj, cgroup) crea un proceso"""
+    root = tmp_path / "proc"
+    monkeypatch.setattr(autotweak, "PROC_ROOT", str(root))
+
+    def add(pid, comm, oom_score=0, rss_pages=100, adj=0, cgroup="/user.slice/session-1.scope"):
+        write(f"{root}/{pid}/comm", comm)
+        write(f"{root}/{pid}/oom_score", str(oom_score))
+        write(f"{root}/{pid}/oom_score_adj", str(adj))
+        write(f"{root}/{pid}/statm", f"{rss_pages * 2} {rss_pages} 0 0 0 0 0")
+        write(f"{root}/{pid}/cgroup", f"0::{cgroup}")
+    add(1, "systemd", oom_score=0)
+    return add
+
+
+def test_oom_candidates_ranking(fake_proc):
+    fake_proc(100, "firefox", oom_score=600, rss_pages=1000)
+    fake_proc(101, "chrome", oom_score=600, rss_pages=5000)
+    fake_proc(102, "vim", oom_score=10, rss_pages=50)
+    fake_proc(103, "kthreadd", oom_score=0, rss_pages=0)
+    fake_proc(104, "postgres", oom_score=900, rss_pages=100, adj=-1000)
+    fake_proc(105, "sshd", oom_score=950, rss_pages=100)
+    fake_proc(106, "kwin_x11", oom_score=950, rss_pages=100)
+    # A igual oom_score decide el RSS; sin RSS, inmunes o protegidos no cuentan
+    assert [c["pid"] for c in autotweak.oom_candidates()] == [101, 100, 102]
+    assert [c["pid"] for c in autotweak.oom_candidates(autotweak.OOM_PROTECTED_PROCESSES + ("chrom*",))] == [100, 102]
+
+
+def test_kill_oom_victim_kills_the_process_group(fake_proc, monkeypatch):
+    fake_proc(200, "bash")
+    fake_proc(201, "make", oom_score=800)
+    monkeypatch.setattr(os, "getpgid", lambda pid: 200)
+    victim = autotweak.oom_candidates()[0]
+    assert autotweak.kill_oom_victim(victim, dry_run=True) == "grupo de procesos 200"
+
+
+def test_kill_oom_victim_spares_a_protected_group_leader(fake_proc, monkeypatch):
+    fake_proc(300, "sshd")
+    fake_proc(301, "make", oom_score=800)
+    monkeypatch.setattr(os, "getpgid", lambda pid: 300)
+    victim = autotweak.oom_candidates()[0]
+    assert victim["pid"] == 301
+    assert autotweak.kill_oom_victim(victim, dry_run=True) == "proceso 301"
+
+
+def test_kill_oom_victim_kills_the_service(fake_proc, monkeypatch):
+    fake_proc(400, "java", cgroup="/system.slice/tomcat.service")
+    fake_proc(401, "java", oom_score=800, cgroup="/system.slice/tomcat.service")
+    monkeypatch.setattr(os, "getpgid", lambda pid: 400)
+    calls = []
+
+    def run_command(command, shell=False, background=False):
+        calls.append(command)
+        return True, "400\n"
+    monkeypatch.setattr(autotweak, "run_command", run_command)
+    assert autotweak.kill_oom_victim(autotweak.oom_candidates()[0]) == "servicio tomcat.service"
+    assert calls[-1] == ["systemctl", "kill", "--signal=SIGKILL", "tomcat.service"]
+
+
+def test_kill_oom_victim_spares_a_service_with_a_protected_main_process(fake_proc, monkeypatch):
+    fake_proc(500, "sshd", cgroup="/system.slice/ssh.service")
+    fake_proc(501, "bash", oom_score=800, cgroup="/system.slice/ssh.service")
+    monkeypatch.setattr(os, "getpgid", lambda pid: 501)
+    monkeypatch.setattr(autotweak, "run_command", lambda command, shell=False, background=False: (True, "500\n"))
+    assert autotweak.kill_oom_victim(autotweak.oom_candidates()[0], dry_run=True) == "grupo de procesos 501"
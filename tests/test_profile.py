@@ -0,0 +1,42 @@
+import os
+
+import pytest
+
+import autotweak
+
+
+@pytest.fixture
+def fake_proc(tmp_path, sysctl_root, monkeypatch):
+    monkeypatch.setattr(autotweak, "PROC_ROOT", str(tmp_path / "proc"))
+    os.makedirs(tmp_path / "proc")
+
+    def boot(boot_id, mem_total_kb):
+        sysctl_root("kernel.random.boot_id", boot_id)
+        with open(tmp_path / "proc" / "meminfo", "w") as f:
+            f.write(f"MemTotal:       {mem_total_kb} kB\nSwapTotal:      0 kB\n")
+    return boot
+
+
+def test_system_profile_cache_follows_boot_id(fake_proc):
+    fake_proc("11111111-aaaa", 1000)
+    profile = autotweak.SystemProfile()
+    assert profile.boot_id == "11111111-aaaa"
+    assert profile.memory["total"] == 1000 * 1024
+
+    # En el mismo arranque se reutiliza la caché sin volver a leer /proc
+    fake_proc("11111111-aaaa", 2000)
+    assert autotweak.SystemProfile().memory["total"] == 1000 * 1024
+
+    # Un boot_id nuevo invalida toda la caché
+    fake_proc("22222222-bbbb", 2000)
+    assert autotweak.SystemProfile().memory["total"] == 2000 * 1024
+
+
+def test_system_profile_refresh(fake_proc):
+    fake_proc("11111111-aaaa", 1000)
+    profile = autotweak.SystemProfile()
+    assert profile.memory["total"] == 1000 * 1024
+    fake_proc("11111111-aaaa", 3000)
+    profile.refresh("memory")
+    assert profile.memory["total"] == 3000 * 1024
+    assert autotweak.SystemProfile().memory["total"] == 3000 * 1024
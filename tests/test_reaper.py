@@ -0,0 +1,98 @@
+import os
+import time
+
+import pytest
+
+import autotweak
+
+OLD = time.time() - 3 * 86400
+
+
+def make(path, size=10, age=OLD):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"x" * size)
+    os.utime(path, (age, age))
+    return path
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / "tmp"
+    root.mkdir()
+    return root
+
+
+def reap(root, **kwargs):
+    return autotweak.reap_temp_files([str(root)], workers=2, **kwargs)[str(root)]
+
+
+def test_reap_deletes_only_old_regular_files(tree):
+    old = make(tree / "a" / "b" / "old.log")
+    recent = make(tree / "a" / "recent.log", age=time.time())
+    os.mkfifo(tree / "pipe")
+    stats = reap(tree)
+    assert not old.exists()
+    assert recent.exists()
+    assert (tree / "pipe").exists()
+    # Los directorios se conservan aunque queden vacíos
+    assert (tree / "a" / "b").is_dir()
+    assert stats["files"] == 1 and stats["errors"] == 0
+
+
+def test_reap_size_owner_and_exclude_filters(tree):
+    small = make(tree / "small", size=10)
+    big = make(tree / "big", size=8192)
+    excluded = make(tree / ".X11-unix" / "big", size=8192)
+    assert reap(tree, min_size=4096, owners=[os.getuid() + 1])["files"] == 0
+    reap(tree, min_size=4096, owners=[os.getuid()], exclude=[".X11-unix"])
+    assert small.exists() and not big.exists() and excluded.exists()
+
+
+def test_reap_dry_run_and_open_files(tree):
+    kept = make(tree / "dry")
+    stats = reap(tree, dry_run=True)
+    assert kept.exists() and stats["files"] == 1
+    with open(kept, "rb"):
+        assert reap(tree)["files"] == 0
+    assert kept.exists()
+
+
+def test_reap_never_follows_symlinks_out_of_the_tree(tree, tmp_path):
+    outside = make(tmp_path / "outside" / "precious")
+    os.symlink(tmp_path / "outside", tree / "link")
+    make(tree / "old")
+    assert reap(tree)["files"] == 1
+    assert outside.exists()
+    assert (tree / "link").is_symlink()
+
+
+def test_open_subdirectory_rejects_a_directory_swapped_for_a_symlink(tree, tmp_path):
+    (tree / "sub").mkdir()
+    (tmp_path / "outside").mkdir()
+    st = os.lstat(tree / "sub")
+    parent = os.open(tree, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        # Entre el lstat y la apertura, alguien cambia el directorio por un enlace
+        os.rmdir(tree / "sub")
+        os.symlink(tmp_path / "outside", tree / "sub")
+        assert autotweak._open_subdirectory(parent, "sub", st) is None
+        # Y un directorio distinto con el mismo nombre tampoco vale
+        os.remove(tree / "sub")
+        (tree / "sub").mkdir()
+        fd = autotweak._open_subdirectory(parent, "sub", st)
+        if fd is not None:
+            # El sistema de archivos reutilizó el inodo: es el directorio que hay ahí
+            assert os.fstat(fd).st_ino == st.st_ino
+            os.close(fd)
+    finally:
+        os.close(parent)
+
+
+def test_reap_deep_trees_beyond_the_queue_limit(tree, monkeypatch):
+    monkeypatch.setattr(autotweak, "REAP_MAX_QUEUED", 1)
+    files = [make(tree / f"d{i}" / f"e{j}" / "old") for i in range(4) for j in range(3)]
+    open_fds = len(os.listdir("/proc/self/fd"))
+    assert reap(tree)["files"] == len(files)
+    assert not any(path.exists() for path in files)
+    # Cada directorio abierto se cierra
+    assert len(os.listdir("/proc/self/fd")) == open_fds
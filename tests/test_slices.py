@@ -0,0 +1,73 @@
+import os
+
+import pytest
+
+import autotweak
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text + "\n")
+
+
+def read(path):
+    with open(path) as f:
+        return f.read().strip()
+
+
+@pytest.fixture
+def fake_tree(tmp_path, monkeypatch):
+    """Un /proc y una jerarquía de cgroup v2 falsos, sin systemd"""
+    proc, cgroup = tmp_path / "proc", tmp_path / "cgroup"
+    monkeypatch.setattr(autotweak, "PROC_ROOT", str(proc))
+    monkeypatch.setattr(autotweak, "CGROUP_ROOT", str(cgroup))
+    monkeypatch.setattr(autotweak, "systemd_running", lambda: False)
+    for name in autotweak.WORKLOAD_SLICES:
+        write(f"{autotweak.slice_cgroup_path(name)}/cgroup.procs", "")
+
+    def add(pid, comm, cgroup_path, flags=0):
+        write(f"{proc}/{pid}/comm", comm)
+        write(f"{proc}/{pid}/cgroup", f"0::{cgroup_path}")
+        fields = ["S", "1", str(pid), str(pid), "0", "-1", str(flags)] + ["0"] * 12 + [str(1000 + pid)]
+        write(f"{proc}/{pid}/stat", f"{pid} ({comm}) {' '.join(fields)}")
+        write(f"{cgroup}{cgroup_path}/cgroup.procs", "")
+    return add
+
+
+def test_apply_slice_rules_records_original_cgroups(fake_tree):
+    fake_tree(100, "make", "/user.slice/session-1.scope")
+    fake_tree(101, "apt", "/user.slice/session-2.scope")
+    fake_tree(102, "vim", "/user.slice/session-1.scope")
+    # Los hilos del kernel (PF_KTHREAD) no se mueven
+    fake_tree(103, "make", "/", flags=0x00200000)
+    changes = {"type": "slices", "actions": []}
+
+    moves = autotweak.apply_slice_rules(changes=changes)
+    assert moves == {"batch": [(100, "make")], "background": [(101, "apt")]}
+    assert read(f"{autotweak.slice_cgroup_path('batch')}/cgroup.procs") == "100"
+    assert changes["moved_processes"] == {
+        "100": {"cgroup": "/user.slice/session-1.scope", "start": "1100"},
+        "101": {"cgroup": "/user.slice/session-2.scope", "start": "1101"},
+    }
+
+    # Al revertir, cada proceso vuelve a su cgroup original
+    target = autotweak.rollback_key_states(changes)
+    assert target["procs:100"] == {"cgroup": "/user.slice/session-1.scope", "start": "1100"}
+    autotweak.apply_rollback_state(target)
+    assert read(f"{autotweak.CGROUP_ROOT}/user.slice/session-1.scope/cgroup.procs") == "100"
+    assert read(f"{autotweak.CGROUP_ROOT}/user.slice/session-2.scope/cgroup.procs") == "101"
+
+
+def test_apply_slice_rules_dry_run_records_nothing(fake_tree):
+    fake_tree(100, "make", "/user.slice/session-1.scope")
+    changes = {"type": "slices", "actions": []}
+    assert autotweak.apply_slice_rules(dry_run=True, changes=changes) == {"batch": [(100, "make")]}
+    assert "moved_processes" not in changes
+    assert read(f"{autotweak.slice_cgroup_path('batch')}/cgroup.procs") == ""
+
+
+def test_slice_unit_content():
+    content = autotweak.slice_unit_content("background", {"cpu.weight": 10, "cpu.max": "50000 100000"})
+    assert content == ("[Unit]\nDescription=AutoTweak background workload slice\n\n"
+                       "[Slice]\nCPUWeight=10\nCPUQuota=50%\n")
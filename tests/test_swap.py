@@ -0,0 +1,34 @@
+import pytest
+
+import autotweak
+
+
+@pytest.fixture
+def no_zswap(tmp_path, monkeypatch):
+    monkeypatch.setattr(autotweak, "ZSWAP_PARAMS", str(tmp_path / "zswap"))
+
+
+def test_choose_swap_layout_when_asking(no_zswap, monkeypatch):
+    monkeypatch.setattr(autotweak, "INTERACTIVE", True)
+    assert autotweak.choose_swap_layout([]) == "zram"
+    assert autotweak.choose_swap_layout([{"path": "/swapfile"}]) == "zswap"
+    assert autotweak.choose_swap_layout([{"path": "/dev/zram0"}]) == "ninguno"
+
+
+def test_build_swap_layout_keeps_current_swap_without_answer(no_zswap, monkeypatch):
+    monkeypatch.setattr(autotweak, "read_swaps", lambda: [])
+
+    def fail(*args, **kwargs):
+        raise AssertionError("no debe tocarse la swap")
+    for name in ("benchmark_zram_algorithms", "install_zram", "configure_zswap", "create_swapfile"):
+        monkeypatch.setattr(autotweak, name, fail)
+    changes = {"actions": []}
+    assert autotweak.build_swap_layout(changes) == "ninguno"
+    assert changes == {"actions": []}
+
+
+def test_apply_swap_layout_option_is_an_answer(monkeypatch):
+    monkeypatch.setattr(autotweak, "apply_command", lambda modules, jobs: {"tasks": {}})
+    args = autotweak.parse_args(["apply", "ram_swap", "--yes", "--swap-layout", "zram"])
+    autotweak.run_subcommand(args)
+    assert autotweak.ANSWERS["swap_layout"] == "zram"
@@ -0,0 +1,157 @@
+import os
+
+import pytest
+
+import autotweak
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+
+
+def test_resolve_sysctl_sources_precedence(tmp_path):
+    root = str(tmp_path)
+    # El mismo nombre en /usr/lib queda oculto por el de /etc
+    write(f"{root}/usr/lib/sysctl.d/50-default.conf", "vm.swappiness = 60\nkernel.pid_max = 4194304\n")
+    write(f"{root}/etc/sysctl.d/50-default.conf", "vm.swappiness = 30\n")
+    write(f"{root}/run/sysctl.d/60-run.conf", "vm/dirty_ratio = 15\n")
+    write(f"{root}/etc/sysctl.d/99-autotweak.conf", "vm.swappiness = 10\nvm.dirty_ratio = 20\n")
+    # sysctl.conf se aplica después de todos los drop-ins
+    write(f"{root}/etc/sysctl.conf", "# comentario\nvm.swappiness=5\n")
+
+    sources = autotweak.list_sysctl_sources(root)
+    assert sources == [f"{root}/etc/sysctl.d/50-default.conf", f"{root}/run/sysctl.d/60-run.conf",
+                       f"{root}/etc/sysctl.d/99-autotweak.conf", f"{root}/etc/sysctl.conf"]
+
+    resolved = autotweak.resolve_sysctl_sources(root=root)
+    assert resolved["vm.swappiness"]["value"] == "5"
+    assert resolved["vm.swappiness"]["source"] == f"{root}/etc/sysctl.conf"
+    assert resolved["vm.swappiness"]["overridden"] == [
+        (f"{root}/etc/sysctl.d/50-default.conf", "30"), (f"{root}/etc/sysctl.d/99-autotweak.conf", "10")]
+    assert resolved["vm.dirty_ratio"]["source"] == f"{root}/etc/sysctl.d/99-autotweak.conf"
+    assert "kernel.pid_max" not in resolved
+    assert set(autotweak.resolve_sysctl_sources(["vm.dirty_ratio"], root=root)) == {"vm.dirty_ratio"}
+
+
+def test_resolve_sysctl_sources_masked_file(tmp_path):
+    root = str(tmp_path)
+    write(f"{root}/usr/lib/sysctl.d/50-default.conf", "vm.swappiness = 60\n")
+    os.makedirs(f"{root}/etc/sysctl.d")
+    os.symlink("/dev/null", f"{root}/etc/sysctl.d/50-default.conf")
+    assert autotweak.resolve_sysctl_sources(root=root) == {}
+
+
+@pytest.mark.parametrize("cpus, mask", [
+    ([], "0"),
+    ([0, 1, 2, 3], "f"),
+    ([1, 3], "a"),
+    ([0, 32], "1,00000001"),
+    ([35, 64], "1,00000008,00000000"),
+])
+def test_cpu_mask_round_trip(cpus, mask):
+    assert autotweak.format_cpu_mask(cpus) == mask
+    assert autotweak.parse_cpu_mask(mask) == set(cpus)
+
+
+def test_parse_cpu_mask_sysfs_format():
+    assert autotweak.parse_cpu_mask("00000000,00000003\n".strip()) == {0, 1}
+    assert autotweak.parse_cpu_mask("") == set()
+
+
+@pytest.fixture
+def tcp_defaults(sysctl_root, monkeypatch):
+    monkeypatch.setattr(autotweak, "kernel_module_available", lambda name: False)
+    sysctl_root("net.ipv4.tcp_rmem", "4096\t131072\t6291456")
+    sysctl_root("net.ipv4.tcp_wmem", "4096\t16384\t4194304")
+    sysctl_root("net.ipv4.tcp_mem", "10\t20\t30")
+    sysctl_root("net.core.rmem_max", "212992")
+    sysctl_root("net.core.wmem_max", "212992")
+    sysctl_root("net.ipv4.tcp_available_congestion_control", "reno cubic")
+    return sysctl_root
+
+
+def test_tcp_sysctl_profile_sizes_buffers_from_bdp(tcp_defaults):
+    # 1 Gbit/s y 80 ms: BDP de 10 MB, búfer de 2 x BDP redondeado a MiB
+    profile = autotweak.tcp_sysctl_profile(1000, 80, ram_bytes=8 << 30)
+    assert profile["net.core.rmem_max"] == 20 * 1024 * 1024
+    assert profile["net.core.wmem_max"] == 20 * 1024 * 1024
+    assert profile["net.ipv4.tcp_rmem"] == (4096, 131072, 20 * 1024 * 1024)
+    assert profile["net.ipv4.tcp_wmem"] == (4096, 16384, 20 * 1024 * 1024)
+    pages = (8 << 30) // os.sysconf("SC_PAGE_SIZE")
+    assert profile["net.ipv4.tcp_mem"] == (pages // 16, pages // 8, pages // 4)
+    assert "net.ipv4.tcp_congestion_control" not in profile
+    assert "net.core.busy_poll" not in profile
+
+
+def test_tcp_sysctl_profile_caps_buffers_by_ram(tcp_defaults):
+    profile = autotweak.tcp_sysctl_profile(100000, 200, ram_bytes=1 << 30)
+    assert profile["net.core.rmem_max"] == (1 << 30) // 32
+
+
+def test_tcp_sysctl_profile_bbr_and_busy_poll(tcp_defaults):
+    tcp_defaults("net.ipv4.tcp_available_congestion_control", "reno cubic bbr")
+    profile = autotweak.tcp_sysctl_profile(100, 1, busy_poll=True, ram_bytes=8 << 30)
+    assert profile["net.ipv4.tcp_congestion_control"] == "bbr"
+    assert "net.core.default_qdisc" not in profile
+    assert profile["net.core.busy_poll"] == 50
+
+
+def test_tcp_sysctl_profile_never_lowers_current_maximums(tcp_defaults):
+    tcp_defaults("net.core.rmem_max", str(64 << 20))
+    tcp_defaults("net.core.wmem_max", str(32 << 20))
+    tcp_defaults("net.ipv4.tcp_mem", f"{1 << 30}\t{1 << 31}\t{1 << 32}")
+    profile = autotweak.tcp_sysctl_profile(100, 1, ram_bytes=8 << 30)
+    assert profile["net.core.rmem_max"] == 64 << 20
+    assert profile["net.core.wmem_max"] == 64 << 20
+    assert profile["net.ipv4.tcp_rmem"][2] == 64 << 20
+    assert profile["net.ipv4.tcp_mem"] == (1 << 30, 1 << 31, 1 << 32)
+
+
+def test_optimize_tcp_journals_changes_when_verification_fails(tcp_defaults, monkeypatch):
+    for param in ("net.ipv4.tcp_notsent_lowat", "net.ipv4.tcp_window_scaling", "net.ipv4.tcp_moderate_rcvbuf"):
+        tcp_defaults(param, "1")
+    monkeypatch.setattr(autotweak, "persist_sysctl_profile", lambda profile, changes: None)
+    calls = []
+
+    def bench(rtt_ms):
+        calls.append(rtt_ms)
+        if len(calls) > 1:
+            raise OSError("no hay red de prueba")
+        return {"tcp_mib_s": 100.0, "rtt_p50_ms": 1.0, "rtt_p99_ms": 2.0, "emulated_rtt_ms": 1}
+    monkeypatch.setattr(autotweak, "bench_tcp_link", bench)
+
+    changes = autotweak.optimize_tcp(1000, 80, busy_poll=False)
+    assert len(calls) == 2
+    [entry] = autotweak.get_journal().active()
+    assert entry["id"] == changes["id"]
+    assert entry["original_values"]["net.core.rmem_max"] == 212992
+    assert "verification" not in entry
+    assert autotweak.read_sysctl("net.core.rmem_max") == 20 * 1024 * 1024
+
+
+def test_remove_legacy_sysctl_blocks_keeps_user_settings(tmp_path):
+    root = str(tmp_path)
+    kernel = "".join(f"# {description}\n{param}={value}\n\n"
+                     for param, value, description in autotweak.KERNEL_SYSCTL_OPTIMIZATIONS)
+    gaming = "".join(f"{param}={value}\n" for param, value in autotweak.GAMING_SYSCTL_PARAMS)
+    write(f"{root}/etc/sysctl.conf",
+          "# ajustes del usuario\nvm.swappiness=20\n"
+          f"\n{autotweak.SYSCTL_LEGACY_KERNEL_HEADER}\n{kernel}"
+          "# mi ajuste\nnet.core.somaxconn=4096\n"
+          f"\n{autotweak.SYSCTL_LEGACY_GAMING_HEADER}\n{gaming}"
+          "kernel.pid_max=4194304\n\n# final\nvm.max_map_count=262144\n")
+
+    changes = {}
+    autotweak.remove_legacy_sysctl_blocks(changes, root)
+    with open(f"{root}/etc/sysctl.conf") as f:
+        assert f.read() == ("# ajustes del usuario\nvm.swappiness=20\n\n"
+                            "# mi ajuste\nnet.core.somaxconn=4096\n"
+                            "kernel.pid_max=4194304\n\n# final\nvm.max_map_count=262144\n")
+    assert f"{root}/etc/sysctl.conf" in changes["original_files"]
+
+    # Sin bloques antiguos no se vuelve a tocar el archivo
+    changes = {}
+    autotweak.remove_legacy_sysctl_blocks(changes, root)
+    assert changes == {}
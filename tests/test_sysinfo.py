@@ -0,0 +1,43 @@
+import subprocess
+import threading
+import time
+
+import autotweak
+
+
+def test_run_probes_deadline_with_a_hanging_probe():
+    release = threading.Event()
+
+    def hanging():
+        release.wait(10)
+        return "tarde"
+
+    def failing():
+        raise subprocess.CalledProcessError(3, ["systemctl", "list-units"])
+
+    start = time.monotonic()
+    try:
+        results, timings, errors = autotweak.run_probes(
+            {"rápida": lambda: 42, "colgada": hanging, "fallida": failing}, timeout=0.2)
+        elapsed = time.monotonic() - start
+    finally:
+        release.set()
+    # Que termine tarde no cambia lo ya devuelto
+    for thread in threading.enumerate():
+        if thread.name == "probe-colgada":
+            thread.join(1)
+    # La sonda colgada no retrasa al resto más allá del plazo
+    assert elapsed < 2
+    assert results == {"rápida": 42}
+    assert errors == {"colgada": "sin respuesta en 200 ms", "fallida": "systemctl terminó con código 3"}
+    assert timings["colgada"] == 200.0
+    assert timings["rápida"] < 200
+
+
+def test_run_probes_reports_probe_timeouts():
+    def slow_command():
+        raise subprocess.TimeoutExpired(["systemd-analyze"], 0.1)
+
+    results, timings, errors = autotweak.run_probes({"arranque": slow_command}, timeout=0.1)
+    assert results == {}
+    assert errors == {"arranque": "sin respuesta en 100 ms"}
@@ -0,0 +1,73 @@
+import threading
+import time
+
+import pytest
+
+import autotweak
+from autotweak import Task
+
+
+def test_check_task_graph_rejects_missing_dependencies():
+    with pytest.raises(ValueError, match="inexistentes: b"):
+        autotweak._check_task_graph([Task("a", print, deps=["b"])])
+
+
+def test_check_task_graph_rejects_cycles():
+    tasks = [Task("a", print, deps=["c"]), Task("b", print, deps=["a"]), Task("c", print, deps=["b"]),
+             Task("d", print)]
+    with pytest.raises(ValueError, match="circulares entre: a, b, c"):
+        autotweak._check_task_graph(tasks)
+
+
+def test_run_task_graph_respects_dependencies():
+    order = []
+    tasks = [Task("second", order.append, args=["second"], deps=["first"]),
+             Task("first", order.append, args=["first"])]
+    report = autotweak.run_task_graph(tasks, max_workers=2)
+    assert order == ["first", "second"]
+    # El informe conserva el orden de la lista de tareas
+    assert list(report["tasks"]) == ["second", "first"]
+    assert all(result["status"] == "ok" for result in report["tasks"].values())
+
+
+def test_run_task_graph_skips_dependents_of_failed_tasks():
+    def fail():
+        raise RuntimeError("sin espacio")
+    ran = []
+    tasks = [Task("broken", fail), Task("child", ran.append, args=["child"], deps=["broken"]),
+             Task("grandchild", ran.append, args=["grandchild"], deps=["child"]),
+             Task("other", ran.append, args=["other"])]
+    report = autotweak.run_task_graph(tasks)
+    assert ran == ["other"]
+    assert report["tasks"]["broken"]["status"] == "failed"
+    assert report["tasks"]["broken"]["error"] == "sin espacio"
+    assert report["tasks"]["child"]["status"] == "skipped"
+    assert report["tasks"]["grandchild"]["status"] == "skipped"
+    assert report["tasks"]["other"]["status"] == "ok"
+
+
+def test_run_task_graph_serializes_shared_resources():
+    lock = threading.Lock()
+    active = {"now": 0, "max": 0, "sysctl": 0}
+
+    def work(resource):
+        with lock:
+            active["now"] += 1
+            active["max"] = max(active["max"], active["now"])
+            if resource:
+                active[resource] += 1
+                assert active[resource] == 1, "dos tareas con el mismo recurso a la vez"
+        time.sleep(0.05)
+        with lock:
+            active["now"] -= 1
+            if resource:
+                active[resource] -= 1
+
+    tasks = [Task("kernel", work, args=["sysctl"], resources={"sysctl"}),
+             Task("tcp", work, args=["sysctl"], resources={"sysctl"}),
+             Task("cleanup", work, args=[None], resources={"pkg"})]
+    report = autotweak.run_task_graph(tasks, max_workers=2)
+    assert all(result["status"] == "ok" for result in report["tasks"].values())
+    # cleanup corre en paralelo con una de las dos tareas de sysctl
+    assert active["max"] == 2
+    assert report["serial"] > report["wall"]
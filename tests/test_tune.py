@@ -0,0 +1,51 @@
+import pytest
+
+import autotweak
+
+
+@pytest.fixture
+def tuning(sysctl_root, monkeypatch):
+    sysctl_root("vm.swappiness", "60")
+    sysctl_root("vm.vfs_cache_pressure", "100")
+    calls = []
+
+    def objective():
+        calls.append(1)
+        # La mejor configuración es swappiness=10 con vfs_cache_pressure=50
+        return -abs(autotweak.read_sysctl("vm.swappiness") - 10) - abs(autotweak.read_sysctl("vm.vfs_cache_pressure") - 50)
+    monkeypatch.setattr(autotweak, "make_benchmark_objective", lambda spec: objective)
+    return calls
+
+
+PARAMS = ["vm.swappiness=10,60", "vm.vfs_cache_pressure=50,100"]
+
+
+def test_tune_leaves_one_active_change_set(tuning):
+    best = autotweak.tune_command(PARAMS, budget=20, repeat=1)
+    assert best == {"vm.swappiness": 10, "vm.vfs_cache_pressure": 50}
+    assert autotweak.read_sysctl("vm.swappiness") == 10
+    [entry] = autotweak.get_journal().active()
+    assert entry["type"] == "tune"
+    assert entry["original_values"] == {"vm.swappiness": 60, "vm.vfs_cache_pressure": 100}
+    # Las pruebas siguen en el historial, sustituidas por el conjunto final
+    trials = autotweak.get_journal().query("tune_trial", include_reverted=True)
+    assert [trial["id"] for trial in trials] == entry["trials"]
+    assert len(trials) == 4
+
+    autotweak.rollback([entry["id"]])
+    assert autotweak.read_sysctl("vm.swappiness") == 60
+    assert autotweak.read_sysctl("vm.vfs_cache_pressure") == 100
+
+
+def test_tune_does_not_remeasure_the_baseline(tuning):
+    autotweak.tune_command(PARAMS, budget=20, repeat=2)
+    # Cuatro configuraciones distintas con dos repeticiones cada una: la
+    # inicial ya medida no se vuelve a probar para mostrar su puntuación
+    assert len(tuning) == 8
+
+
+def test_tune_with_zero_budget(tuning):
+    assert autotweak.tune_command(PARAMS, budget=0) is None
+    assert tuning == []
+    assert autotweak.get_journal().active() == []
+    assert autotweak.read_sysctl("vm.swappiness") == 60